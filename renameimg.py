@@ -1,14 +1,23 @@
 import sys
 import os
+import math
 import shutil
 import subprocess
+import sqlite3
+import hashlib
+import time
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QGraphicsView, QGraphicsScene,
                              QGraphicsSimpleTextItem, QGraphicsItem, QFileDialog,
                              QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
                              QLineEdit, QComboBox, QColorDialog, QMessageBox, QFrame,
                              QSlider, QStyle, QListWidget, QCheckBox)
-from PyQt5.QtCore import Qt, QRectF, QTimer, pyqtSignal
-from PyQt5.QtGui import QPixmap, QFont, QColor, QImage, QPainter, QPen, QBrush, QPainterPath, QFontMetrics, QTransform
+from PyQt5.QtCore import Qt, QRectF, QSize, QTimer, QThread, pyqtSignal
+from PyQt5.QtGui import (QPixmap, QFont, QColor, QImage, QPainter, QPen, QBrush, QPainterPath, QFontMetrics,
+                         QTransform, QImageReader, QImageIOHandler)
+
+# 超过这个像素数的大图，预览时只解码缩小版，保存时再读取原图
+LARGE_IMAGE_PIXELS = 50000000
+PREVIEW_MAX_SIDE = 4096
 
 
 # === 1. 自定义点击标签 (用于彩蛋) ===
@@ -37,6 +46,26 @@ class SecretLabel(QLabel):
 
 
 # === 2. 自定义水印文字组件 ===
+def text_path(text, font):
+    fm = QFontMetrics(font)
+    path = QPainterPath()
+    path.addText(0, fm.ascent(), font, text)
+    return path
+
+
+def draw_outlined_path(painter, path, fill_color, outline_color, outline_width):
+    """先画描边再填充，单个水印和平铺水印共用"""
+    pen = QPen(outline_color, outline_width)
+    pen.setJoinStyle(Qt.RoundJoin)
+    painter.setPen(pen)
+    painter.setBrush(Qt.NoBrush)
+    painter.drawPath(path)
+
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(QBrush(fill_color))
+    painter.drawPath(path)
+
+
 class DraggableTextItem(QGraphicsSimpleTextItem):
     def __init__(self, text):
         super().__init__(text)
@@ -75,20 +104,8 @@ class DraggableTextItem(QGraphicsSimpleTextItem):
 
     def paint(self, painter, option, widget):
         option.state &= ~QStyle.State_Selected
-        path = QPainterPath()
-        font = self.font()
-        fm = QFontMetrics(font)
-        path.addText(0, fm.ascent(), font, self.text())
-
-        pen = QPen(self._outline_color, self._outline_width)
-        pen.setJoinStyle(Qt.RoundJoin)
-        painter.setPen(pen)
-        painter.setBrush(Qt.NoBrush)
-        painter.drawPath(path)
-
-        painter.setPen(Qt.NoPen)
-        painter.setBrush(QBrush(self._fill_color))
-        painter.drawPath(path)
+        path = text_path(self.text(), self.font())
+        draw_outlined_path(painter, path, self._fill_color, self._outline_color, self._outline_width)
 
     def boundingRect(self):
         rect = super().boundingRect()
@@ -96,7 +113,220 @@ class DraggableTextItem(QGraphicsSimpleTextItem):
         return rect.adjusted(-margin, -margin, margin, margin)
 
 
-# === 3. 主程序 ===
+# === 3. 平铺水印 (整图重复) ===
+def build_watermark_tile(text, font, fill_color, outline_color, outline_width, angle, spacing_percent):
+    """把一个带描边、已旋转的水印画成一块贴图，平铺时只需要画这一次"""
+    path = text_path(text, font)
+    margin = outline_width / 2
+    text_rect = path.boundingRect().adjusted(-margin, -margin, margin, margin)
+
+    # 旋转后的外接矩形 + 间距 = 贴图大小，保证相邻水印互不遮挡
+    # 间距按文字高度的百分比计算，跟随字号缩放
+    rotated = QTransform().rotate(angle).mapRect(text_rect)
+    spacing = text_rect.height() * spacing_percent / 100
+    w = max(1, math.ceil(rotated.width() + spacing))
+    h = max(1, math.ceil(rotated.height() + spacing))
+    image = QImage(w, h, QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+
+    painter = QPainter(image)
+    try:
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.translate(w / 2, h / 2)
+        painter.rotate(angle)
+        painter.translate(-text_rect.center())
+        draw_outlined_path(painter, path, fill_color, outline_color, outline_width)
+    finally:
+        painter.end()
+    return QPixmap.fromImage(image)
+
+
+class TiledWatermarkItem(QGraphicsItem):
+    """用缓存的水印贴图作为纹理画刷填满整张图片"""
+
+    def __init__(self, rect, tile):
+        super().__init__()
+        self._rect = QRectF(rect)
+        self._tile = tile
+
+    def set_rect(self, rect):
+        self.prepareGeometryChange()
+        self._rect = QRectF(rect)
+
+    def set_tile(self, tile):
+        self._tile = tile
+        self.update()
+
+    def boundingRect(self):
+        return self._rect
+
+    def paint(self, painter, option, widget):
+        if self._tile is None or self._tile.isNull():
+            return
+        painter.fillRect(self._rect, QBrush(self._tile))
+
+
+# === 4. 已处理图片索引 (每个文件夹一个 SQLite 库) ===
+class ProcessedIndex:
+    """记录已保存(加水印 + 重命名)的图片，重新打开文件夹时用于标记/跳过"""
+    DB_NAME = ".renameimg_index.db"
+
+    def __init__(self, folder):
+        self.conn = None
+        try:
+            self.conn = sqlite3.connect(os.path.join(folder, self.DB_NAME))
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS processed (
+                    target_name TEXT PRIMARY KEY,
+                    source_name TEXT,
+                    fingerprint TEXT,
+                    size INTEGER,
+                    mtime REAL,
+                    watermark_text TEXT,
+                    font_size INTEGER,
+                    color TEXT,
+                    angle INTEGER,
+                    pos_x REAL,
+                    pos_y REAL,
+                    saved_at REAL,
+                    tiled INTEGER DEFAULT 0,
+                    tile_spacing INTEGER DEFAULT 0
+                )
+            """)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            # 文件夹只读等情况下不影响正常使用，只是没有索引
+            print(f"索引警告: {e}")
+            self.conn = None
+
+    @staticmethod
+    def file_fingerprint(path, should_stop=None):
+        """计算文件的 SHA-1；should_stop 每读一块检查一次，返回真时中止并返回 None"""
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                if should_stop and should_stop():
+                    return None
+                h.update(chunk)
+        return h.hexdigest()
+
+    def quick_check(self, path):
+        """只比较大小和修改时间，不计算指纹。
+
+        返回 (是否已处理, 待核对的指纹)。只有修改时间变了(复制/touch)时才返回指纹，
+        由后台线程重新计算后调用 confirm。
+        """
+        if not self.conn:
+            return False, None
+        try:
+            row = self.conn.execute(
+                "SELECT fingerprint, size, mtime FROM processed WHERE target_name = ?",
+                (os.path.basename(path),)).fetchone()
+            if row is None:
+                return False, None
+            fingerprint, size, mtime = row
+            st = os.stat(path)
+            # 大小和修改时间都没变，直接认为已处理
+            if st.st_size == size and st.st_mtime == mtime:
+                return True, None
+            # 大小变了，内容肯定变了
+            if st.st_size != size:
+                return False, None
+            return False, fingerprint
+        except (sqlite3.Error, OSError) as e:
+            print(f"索引警告: {e}")
+            return False, None
+
+    def confirm(self, path):
+        """指纹核对一致后，更新修改时间，下次打开就不用再计算"""
+        if not self.conn:
+            return
+        try:
+            self.conn.execute("UPDATE processed SET mtime = ? WHERE target_name = ?",
+                              (os.stat(path).st_mtime, os.path.basename(path)))
+            self.conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            print(f"索引警告: {e}")
+
+    def record(self, source_path, target_path, settings):
+        if not self.conn:
+            return
+        source_name = os.path.basename(source_path)
+        target_name = os.path.basename(target_path)
+        try:
+            st = os.stat(target_path)
+            fingerprint = self.file_fingerprint(target_path)
+            # 源文件已被删除/覆盖，旧记录作废
+            if source_name != target_name:
+                self.conn.execute("DELETE FROM processed WHERE target_name = ?", (source_name,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO processed (target_name, source_name, fingerprint, size, mtime, "
+                "watermark_text, font_size, color, angle, pos_x, pos_y, saved_at, tiled, tile_spacing) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (target_name, source_name, fingerprint, st.st_size, st.st_mtime,
+                 settings.get("text", ""), settings.get("font_size", 0), settings.get("color", ""),
+                 settings.get("angle", 0), settings.get("pos_x", 0.0), settings.get("pos_y", 0.0),
+                 time.time(), int(settings.get("tiled", False)), settings.get("tile_spacing", 0)))
+            self.conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            print(f"索引警告: {e}")
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+
+# === 5. 后台扫描图片头信息 (不做完整解码) ===
+def read_image_header(path):
+    """用 QImageReader 只解析文件头：格式、尺寸、帧数、EXIF 方向"""
+    info = {"valid": False, "format": "", "width": 0, "height": 0, "frames": 0,
+            "orientation": int(QImageIOHandler.TransformationNone), "error": ""}
+    reader = QImageReader(path)
+    if not reader.canRead():
+        info["error"] = reader.errorString()
+        return info
+    size = reader.size()
+    if not size.isValid():
+        info["error"] = "无法读取图片尺寸"
+        return info
+    info["valid"] = True
+    info["format"] = bytes(reader.format()).decode("ascii", "ignore")
+    info["width"] = size.width()
+    info["height"] = size.height()
+    # 单帧格式可能返回 0
+    info["frames"] = max(1, reader.imageCount())
+    info["orientation"] = int(reader.transformation())
+    return info
+
+
+class ImageScanThread(QThread):
+    scanned = pyqtSignal(int, str, object)
+    # 修改时间变了的已处理文件，在后台重新计算指纹核对
+    verified = pyqtSignal(int, str, bool)
+
+    def __init__(self, paths, pending_fingerprints=None, parent=None):
+        super().__init__(parent)
+        self._paths = list(paths)
+        self._pending = dict(pending_fingerprints or {})
+
+    def run(self):
+        for index, path in enumerate(self._paths):
+            if self.isInterruptionRequested():
+                return
+            self.scanned.emit(index, path, read_image_header(path))
+            if path in self._pending:
+                try:
+                    fingerprint = ProcessedIndex.file_fingerprint(path, self.isInterruptionRequested)
+                except OSError:
+                    fingerprint = ""
+                # 大文件计算到一半被中止，不等它算完
+                if fingerprint is None:
+                    return
+                self.verified.emit(index, path, fingerprint == self._pending[path])
+
+
+# === 6. 主程序 ===
 class WatermarkApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -108,11 +338,30 @@ class WatermarkApp(QMainWindow):
         self.current_index = -1
         self.current_image_path = None
 
+        # 已处理图片索引
+        self.processed_index = None
+        self.processed_files = set()
+        # 打开文件夹后用户还没手动切换图片时，后台核对完成可以自动跳过已处理的图片
+        self.auto_resume = False
+
+        # 每张图片的旋转角度 (0/90/180/270)，只作用于预览，保存时才真正转置像素
+        self.image_rotations = {}
+
+        # 后台扫描得到的图片头信息，以及当前图片的原始尺寸
+        self.image_info = {}
+        self.scan_thread = None
+        self.source_size = QSize()
+
         self.scene = QGraphicsScene()
         self.pixmap_item = None
         self.text_item = None
+        self.tile_item = None
         self.watermark_color = QColor(255, 255, 255)
 
+        # 平铺水印贴图缓存：设置不变时切换图片也不需要重画
+        self._tile_key = None
+        self._tile_pixmap = None
+
         # 记录上一张水印，实现延续功能
         self.last_watermark_text = ""
 
@@ -235,6 +484,20 @@ class WatermarkApp(QMainWindow):
         hbox_rot.addWidget(self.combo_rotate)
         controls_layout.addLayout(hbox_rot)
 
+        hbox_tile = QHBoxLayout()
+        self.chk_tile = QCheckBox("平铺水印")
+        self.chk_tile.setToolTip("选中后，水印按当前角度重复铺满整张图片")
+        self.chk_tile.stateChanged.connect(self.update_tiled_watermark)
+        hbox_tile.addWidget(self.chk_tile)
+        hbox_tile.addWidget(QLabel("间距:"))
+        self.slider_tile_spacing = QSlider(Qt.Horizontal)
+        self.slider_tile_spacing.setRange(0, 300)
+        self.slider_tile_spacing.setValue(50)
+        self.slider_tile_spacing.setToolTip("水印之间的间距，按文字高度的百分比计算")
+        self.slider_tile_spacing.valueChanged.connect(self.update_tiled_watermark)
+        hbox_tile.addWidget(self.slider_tile_spacing)
+        controls_layout.addLayout(hbox_tile)
+
         controls_layout.addWidget(QLabel("输出文件名:"))
         self.edt_filename = QLineEdit()
         self.edt_filename.setFixedHeight(30)
@@ -339,6 +602,7 @@ class WatermarkApp(QMainWindow):
     def on_file_list_clicked(self, item):
         index = self.file_list_widget.row(item)
         if index != self.current_index:
+            self.auto_resume = False
             self.current_index = index
             self.load_image()
 
@@ -367,14 +631,122 @@ class WatermarkApp(QMainWindow):
                 QMessageBox.warning(self, "提示", "无图片！")
                 return
 
-            self.file_list_widget.clear()
+            if self.processed_index:
+                self.processed_index.close()
+            self.processed_index = ProcessedIndex(folder)
+            self.image_rotations = {}
+            self.image_info = {}
+            self.processed_files = set()
+            pending_fingerprints = {}
             for f in self.image_files:
+                processed, fingerprint = self.processed_index.quick_check(f)
+                if processed:
+                    self.processed_files.add(f)
+                elif fingerprint:
+                    pending_fingerprints[f] = fingerprint
+
+            self.file_list_widget.clear()
+            for i, f in enumerate(self.image_files):
                 self.file_list_widget.addItem(os.path.basename(f))
+                self.refresh_file_item(i)
 
+            # 跳到第一张未处理的图片
             self.current_index = 0
+            for i, f in enumerate(self.image_files):
+                if f not in self.processed_files:
+                    self.current_index = i
+                    break
             self.last_watermark_text = ""
+            self.auto_resume = True
+            self.start_image_scan(pending_fingerprints)
             self.load_image()
 
+    def resume_from_current(self):
+        """从当前位置往后跳到第一张未处理、且没被标记为损坏的图片"""
+        for i in range(self.current_index, len(self.image_files)):
+            path = self.image_files[i]
+            info = self.image_info.get(path)
+            if path not in self.processed_files and not (info and not info["valid"]):
+                if i != self.current_index:
+                    self.current_index = i
+                    self.load_image()
+                return
+
+    def start_image_scan(self, pending_fingerprints=None):
+        self.stop_image_scan()
+        self.scan_thread = ImageScanThread(self.image_files, pending_fingerprints, self)
+        self.scan_thread.scanned.connect(self.on_image_scanned)
+        self.scan_thread.verified.connect(self.on_fingerprint_verified)
+        self.scan_thread.start()
+
+    def stop_image_scan(self):
+        if self.scan_thread:
+            self.scan_thread.requestInterruption()
+            self.scan_thread.wait()
+            # 线程以窗口为父对象，不手动释放会一直挂在窗口上
+            self.scan_thread.deleteLater()
+            self.scan_thread = None
+
+    def on_image_scanned(self, index, path, info):
+        # 扫描期间文件可能已被重命名或换了文件夹
+        if index >= len(self.image_files) or self.image_files[index] != path:
+            return
+        self.image_info[path] = info
+        self.refresh_file_item(index)
+        # 打开时停在了一张损坏的图片上，跳到后面能处理的图片
+        if self.auto_resume and index == self.current_index and not info["valid"]:
+            self.resume_from_current()
+
+    def on_fingerprint_verified(self, index, path, ok):
+        if not ok or index >= len(self.image_files) or self.image_files[index] != path:
+            return
+        self.processed_files.add(path)
+        if self.processed_index:
+            self.processed_index.confirm(path)
+        self.refresh_file_item(index)
+        # 打开时停在了这张，核对后发现已处理过，继续往后跳
+        if self.auto_resume and index == self.current_index:
+            self.resume_from_current()
+
+    def closeEvent(self, event):
+        self.stop_image_scan()
+        if self.processed_index:
+            self.processed_index.close()
+        super().closeEvent(event)
+
+    def refresh_file_item(self, index):
+        """根据是否已处理和图片头信息，更新列表项的显示"""
+        item = self.file_list_widget.item(index)
+        if not item:
+            return
+        path = self.image_files[index]
+        file_name = os.path.basename(path)
+        info = self.image_info.get(path)
+        tips = []
+
+        if info and not info["valid"]:
+            item.setText(f"✖ {file_name}  (无法读取)")
+            item.setForeground(QBrush(QColor(200, 0, 0)))
+            item.setToolTip(f"文件损坏或格式不支持: {info['error']}")
+            return
+
+        text = f"✔ {file_name}" if path in self.processed_files else file_name
+        if info:
+            text += f"  ({info['width']}×{info['height']})"
+            tips.append(f"{info['format'].upper()} {info['width']}×{info['height']}")
+            if info["frames"] > 1:
+                tips.append(f"动图({info['frames']}帧)，只会保存第一帧")
+            if info["orientation"] != int(QImageIOHandler.TransformationNone):
+                tips.append("带有 EXIF 方向信息")
+        item.setText(text)
+
+        if path in self.processed_files:
+            item.setForeground(QBrush(QColor(150, 150, 150)))
+            tips.insert(0, "已处理")
+        else:
+            item.setData(Qt.ForegroundRole, None)
+        item.setToolTip("\n".join(tips))
+
     def record_current_pos(self):
         if self.zoom_slider.value() != 0:
             return
@@ -384,7 +756,7 @@ class WatermarkApp(QMainWindow):
 
         if self.pixmap_item and self.text_item and self.text_item.scene() == self.scene:
             try:
-                img_rect = self.pixmap_item.boundingRect()
+                img_rect = self.image_rect()
                 w, h = img_rect.width(), img_rect.height()
                 if w > 0 and h > 0:
                     pos = self.text_item.pos()
@@ -410,6 +782,7 @@ class WatermarkApp(QMainWindow):
         self.scene.clear()
         self.pixmap_item = None
         self.text_item = None
+        self.tile_item = None
 
         self.zoom_slider.blockSignals(True)
         self.zoom_slider.setValue(0)
@@ -426,8 +799,14 @@ class WatermarkApp(QMainWindow):
         self.lbl_status.setText(f"当前文件: {file_name}")
         self.setWindowTitle(f"拍了个器Renameimg - ({self.current_index + 1}/{len(self.image_files)}) {file_name}")
 
-        pixmap = QPixmap(self.current_image_path)
+        info = self.image_info.get(self.current_image_path)
+        if info and not info["valid"]:
+            self.lbl_status.setText(f"无法读取: {file_name} ({info['error']})")
+            return
+
+        pixmap = self.load_preview_pixmap(self.current_image_path, info)
         if pixmap.isNull():
+            self.lbl_status.setText(f"无法读取: {file_name}")
             return
 
         self.zoom_overlay.setVisible(True)
@@ -437,7 +816,7 @@ class WatermarkApp(QMainWindow):
         self.zoom_overlay.move(int((view_width - w) / 2), 10)
 
         self.pixmap_item = self.scene.addPixmap(pixmap)
-        self.scene.setSceneRect(QRectF(pixmap.rect()))
+        self.apply_image_rotation()
 
         # === 逻辑：延续水印 ===
         initial_watermark = self.last_watermark_text if self.last_watermark_text else ""
@@ -461,41 +840,83 @@ class WatermarkApp(QMainWindow):
             if self.chk_lock_bottom.isChecked():
                 self.move_to_bottom_center()
             else:
-                img_rect = self.pixmap_item.boundingRect()
+                img_rect = self.image_rect()
                 tx = img_rect.width() * self.last_pos_ratio[0]
                 ty = img_rect.height() * self.last_pos_ratio[1]
                 self.text_item.setPos(tx, ty)
         else:
-            self.text_item.setPos(pixmap.width() / 2, pixmap.height() / 2)
+            img_rect = self.image_rect()
+            self.text_item.setPos(img_rect.width() / 2, img_rect.height() / 2)
 
         self.update_watermark_style()
         self.fit_image_in_view()
 
+    def load_preview_pixmap(self, path, info):
+        """读取预览图。已知是大图时只解码缩小版，原图尺寸记录在 source_size"""
+        reader = QImageReader(path)
+        if info:
+            self.source_size = QSize(info["width"], info["height"])
+        else:
+            self.source_size = reader.size()
+        if self.source_size.isValid() and \
+                self.source_size.width() * self.source_size.height() > LARGE_IMAGE_PIXELS:
+            reader.setScaledSize(self.source_size.scaled(PREVIEW_MAX_SIDE, PREVIEW_MAX_SIDE, Qt.KeepAspectRatio))
+        pixmap = QPixmap.fromImage(reader.read())
+        if not self.source_size.isValid():
+            self.source_size = pixmap.size()
+        return pixmap
+
+    def load_source_image(self):
+        """保存时使用的原图；预览是缩小版时重新读取原始文件"""
+        pixmap = self.pixmap_item.pixmap()
+        if pixmap.size() == self.source_size:
+            return pixmap.toImage()
+        return QImageReader(self.current_image_path).read()
+
     def rotate_image_clockwise(self):
         """顺时针旋转图片90度，并适配场景"""
         if not self.pixmap_item:
             return
 
-        # 1. 获取当前图片并旋转
-        current_pix = self.pixmap_item.pixmap()
-        transform = QTransform().rotate(90)
-        # 使用 SmoothTransformation 保证旋转后边缘平滑
-        new_pix = current_pix.transformed(transform, Qt.SmoothTransformation)
+        # 1. 只记录角度，不重采样像素 (保存时再做一次无损转置)
+        rotation = (self.current_rotation() + 90) % 360
+        self.image_rotations[self.current_image_path] = rotation
 
-        # 2. 更新场景中的图片
-        self.pixmap_item.setPixmap(new_pix)
+        # 2. 旋转图片显示，并更新场景大小以适应旋转后的尺寸
+        self.apply_image_rotation()
 
-        # 3. 更新场景大小以适应新图片尺寸
-        rect = QRectF(new_pix.rect())
-        self.scene.setSceneRect(rect)
-
-        # 4. 如果启用了"锁定底部"，旋转后长宽互换，必须重新计算水印位置
+        # 3. 如果启用了"锁定底部"，旋转后长宽互换，必须重新计算水印位置
         if self.chk_lock_bottom.isChecked():
             self.move_to_bottom_center()
 
-        # 5. 适配视图
+        if self.tile_item:
+            self.tile_item.set_rect(self.image_rect())
+
+        # 4. 适配视图
         self.fit_image_in_view()
 
+    def current_rotation(self):
+        return self.image_rotations.get(self.current_image_path, 0)
+
+    def apply_image_rotation(self):
+        """把当前图片的旋转角度作为图元变换应用到预览上"""
+        if not self.pixmap_item:
+            return
+        rect = QRectF(self.pixmap_item.pixmap().rect())
+        # 大图预览是缩小版，放大回原图尺寸，保证场景坐标始终是原图像素
+        # 宽高分别计算比例，缩小时高度被取整，不能只用宽度的比例
+        sx = self.source_size.width() / rect.width() if rect.width() else 1.0
+        sy = self.source_size.height() / rect.height() if rect.height() else 1.0
+        transform = QTransform.fromScale(sx, sy) * QTransform().rotate(self.current_rotation())
+        # 旋转后平移回原点，保证图片始终从 (0, 0) 开始
+        mapped = transform.mapRect(rect)
+        transform = transform * QTransform.fromTranslate(-mapped.left(), -mapped.top())
+        self.pixmap_item.setTransform(transform)
+        self.scene.setSceneRect(self.image_rect())
+
+    def image_rect(self):
+        """图片在场景中的显示区域 (已考虑旋转后的宽高互换)"""
+        return self.pixmap_item.sceneBoundingRect()
 
     def fit_image_in_view(self, apply_transform=True):
         if self.pixmap_item and self.zoom_slider.value() == 0 and apply_transform:
@@ -511,6 +932,7 @@ class WatermarkApp(QMainWindow):
                     self.move_to_bottom_center()
             except RuntimeError:
                 self.text_item = None
+        self.update_tiled_watermark()
         self.edt_filename.setText(text)
 
     def on_lock_bottom_changed(self, state):
@@ -525,7 +947,7 @@ class WatermarkApp(QMainWindow):
         if not text_content:
             return
 
-        img_rect = self.pixmap_item.boundingRect()
+        img_rect = self.image_rect()
         img_w = img_rect.width()
         img_h = img_rect.height()
 
@@ -605,6 +1027,42 @@ class WatermarkApp(QMainWindow):
 
         except RuntimeError:
             self.text_item = None
+        self.update_tiled_watermark()
+
+    def watermark_tile(self):
+        """返回当前设置下的水印贴图，只有设置变化时才重新生成"""
+        font = self.text_item.font()
+        font.setPointSize(self.slider_size.value())
+        # 描边与单个水印保持一致，直接取水印文字组件的设置
+        outline_color = self.text_item._outline_color
+        outline_width = self.text_item._outline_width
+        key = (self.text_item.text(), font.toString(), self.watermark_color.rgba(),
+               outline_color.rgba(), outline_width,
+               int(self.combo_rotate.currentText()), self.slider_tile_spacing.value())
+        if key != self._tile_key:
+            self._tile_pixmap = build_watermark_tile(key[0], font, self.watermark_color, outline_color,
+                                                     outline_width, key[5], key[6])
+            self._tile_key = key
+        return self._tile_pixmap
+
+    def update_tiled_watermark(self):
+        if not self.text_item or not self.pixmap_item:
+            return
+        tiled = self.chk_tile.isChecked() and bool(self.text_item.text())
+        self.text_item.setVisible(not tiled)
+        if not tiled:
+            if self.tile_item:
+                self.tile_item.setVisible(False)
+            return
+
+        tile = self.watermark_tile()
+        if not self.tile_item:
+            self.tile_item = TiledWatermarkItem(self.image_rect(), tile)
+            self.scene.addItem(self.tile_item)
+        else:
+            self.tile_item.set_rect(self.image_rect())
+            self.tile_item.set_tile(tile)
+        self.tile_item.setVisible(True)
 
     def update_transform_origin(self):
         if self.text_item:
@@ -620,11 +1078,13 @@ class WatermarkApp(QMainWindow):
 
 
     def prev_image(self):
+        self.auto_resume = False
         if self.current_index > 0:
             self.current_index -= 1
             self.load_image()
 
     def next_image(self):
+        self.auto_resume = False
         if self.current_index < len(self.image_files) - 1:
             self.current_index += 1
             self.load_image()
@@ -639,6 +1099,12 @@ class WatermarkApp(QMainWindow):
         if not self.current_image_path or not self.pixmap_item:
             return
 
+        if self.current_image_path in self.processed_files:
+            reply = QMessageBox.question(self, "提示", "这张图片已经处理过，再次保存会重复添加水印。是否继续？",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+
         # 记录当前水印内容
         self.last_watermark_text = self.edt_watermark.text()
         self.record_current_pos()
@@ -688,10 +1154,18 @@ class WatermarkApp(QMainWindow):
             print(f"备份警告: {e}")
 
         self.scene.clearSelection()
-        original_size = self.pixmap_item.pixmap().size()
-        image = QImage(original_size, QImage.Format_ARGB32)
-        image.fill(Qt.transparent)
-
+        image = self.load_source_image()
+        if image.isNull():
+            QMessageBox.critical(self, "失败", "无法读取原图")
+            return
+        rotation = self.current_rotation()
+        if rotation:
+            # 90 度整数倍的旋转是无损的像素转置，只在输出时做这一次
+            image = image.transformed(QTransform().rotate(rotation))
+        image = image.convertToFormat(QImage.Format_ARGB32)
+
+        # 底图已经画好，只把水印渲染上去
+        self.pixmap_item.setVisible(False)
         painter = QPainter(image)
         try:
             painter.setRenderHint(QPainter.Antialiasing)
@@ -700,11 +1174,26 @@ class WatermarkApp(QMainWindow):
             self.scene.render(painter, target=QRectF(image.rect()), source=self.scene.sceneRect())
         finally:
             painter.end()
+            self.pixmap_item.setVisible(True)
 
         # 保存图片
         if image.save(save_path, None, 100):
             print(f"Saved: {save_path}")
 
+            if self.processed_index:
+                img_rect = self.image_rect()
+                pos = self.text_item.pos() if self.text_item else None
+                self.processed_index.record(self.current_image_path, save_path, {
+                    "text": self.edt_watermark.text(),
+                    "font_size": self.slider_size.value(),
+                    "color": self.watermark_color.name(),
+                    "angle": int(self.combo_rotate.currentText()),
+                    "pos_x": pos.x() / img_rect.width() if pos and img_rect.width() else 0.0,
+                    "pos_y": pos.y() / img_rect.height() if pos and img_rect.height() else 0.0,
+                    "tiled": self.tile_item is not None and self.tile_item.isVisible(),
+                    "tile_spacing": self.slider_tile_spacing.value(),
+                })
+
             # 删除原文件逻辑（如果保存路径和原路径不同）
             if os.path.abspath(self.current_image_path) != os.path.abspath(save_path):
                 try:
@@ -714,10 +1203,14 @@ class WatermarkApp(QMainWindow):
                     print(f"Delete failed: {e}")
 
             # 更新当前列表中的文件路径和显示名称
+            # 旋转已经写进输出文件，新文件不再需要旋转
+            self.image_rotations.pop(self.current_image_path, None)
+            self.image_info.pop(self.current_image_path, None)
+            self.image_info[save_path] = read_image_header(save_path)
+            self.processed_files.discard(self.current_image_path)
+            self.processed_files.add(save_path)
             self.image_files[self.current_index] = save_path
-            item = self.file_list_widget.item(self.current_index)
-            if item:
-                item.setText(os.path.basename(save_path))
+            self.refresh_file_item(self.current_index)
 
             self.next_image()
         else: